@@ -1,15 +1,80 @@
 #!/usr/bin/env python3
 import os
+import stat
 import sys
-import json
 import argparse
+import functools
+from itertools import accumulate, repeat
 from pathlib import Path
 
+# Needed so os.open/os.read don't do newline translation on Windows
+_O_BINARY = getattr(os, 'O_BINARY', 0)
+
+# Split parts are kept this much under the size limit
+_SPLIT_HEADROOM = 1024 * 1024
+
+# Upper bound on files split/merged concurrently
+_MAX_WORKERS = 8
+
+# Upper bound on parts of a single file copied concurrently during merge
+_MAX_PART_WORKERS = 4
+
+# Buffer size for hashing and the read/write fallback when no in-kernel copy is available.
+# One buffer per worker thread, so this bounds the extra RSS at
+# _MAX_WORKERS * (_MAX_PART_WORKERS + 1) buffers regardless of --size-limit
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+@functools.lru_cache(maxsize=None)
+def _json_codec():
+    """Return (loads, dumps) for the manifest, using orjson when installed and the json module otherwise.
+    
+    Both work on bytes; dumps(obj, indent=True) pretty-prints with two spaces.
+    Imported on first use so commands that never touch the manifest don't pay for it.
+    """
+    try:
+        import orjson
+    except ImportError:
+        import json
+        # Match orjson's output byte for byte (raw UTF-8, same separators), so the committed
+        # manifest doesn't change encoding depending on which machine last ran build
+        return json.loads, lambda obj, indent=False: json.dumps(
+            obj, ensure_ascii=False, indent=2 if indent else None,
+            separators=(',', ': ') if indent else (',', ':')).encode('utf-8')
+    return orjson.loads, lambda obj, indent=False: orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+@functools.lru_cache(maxsize=None)
+def _blake3():
+    """Return the blake3 constructor if the package is installed, else None (imported on first use)"""
+    try:
+        from blake3 import blake3
+    except ImportError:
+        return None
+    return blake3
+
+def _default_hash_algorithm():
+    """Prefer BLAKE3 when installed; hashlib's SHA-256 goes through OpenSSL (SHA-NI) otherwise"""
+    return 'blake3' if _blake3() is not None else 'sha256'
+
+class Candidate:
+    """A file found by find_large_files, with the size seen during the scan"""
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
 class LargeFileManager:
     def __init__(self, size_limit="100M", split_info_file="split_files_info.json"):
         self.size_limit_bytes = self._parse_size(size_limit)
+        if self.size_limit_bytes <= _SPLIT_HEADROOM:
+            # Parts are size_limit - 1MB, so anything smaller would leave nothing to put in them
+            raise ValueError(f"size limit must be larger than 1M, got {size_limit}")
         self.split_info_file = split_info_file
+        # Append-only log of entries recorded since the JSON manifest was last compacted
+        self.split_info_log = str(Path(split_info_file).with_suffix('.jsonl'))
         self.gitignore_path = Path(".gitignore")
+        # Per-thread reusable I/O buffer, see _buffer(). Imported here rather than at module
+        # level so 'help' doesn't pay for it
+        import threading
+        self._local = threading.local()
     
     def _parse_size(self, size_str):
         """Convert size string like '100M' to bytes"""
@@ -22,22 +87,89 @@ class LargeFileManager:
         else:
             return int(size_str)
     
-    def find_large_files(self):
-        """Find files larger than size limit, excluding files in directories starting with ."""
+    def _scan_large_files(self, directory):
+        """Yield (path, size) of files larger than size limit under directory, skipping directories starting with ."""
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            return  # unreadable directory, os.walk skipped these silently too
+        
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith('.'):
+                        yield from self._scan_large_files(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    try:
+                        size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    if size > self.size_limit_bytes:
+                        yield entry.path, size
+    
+    def _find_via_git(self, split_info):
+        """List (path, size) of large files git knows about, or return None outside a git work tree.
+        
+        Lists tracked and untracked-but-not-ignored files, so ignored trees (venvs, caches, ...)
+        are never walked. build gitignores every original it splits, so those are checked
+        explicitly: the ones recorded in split_info, plus the plain paths listed in .gitignore
+        for when the manifest is gone (e.g. 'make rebuild' runs clean before build).
+        """
+        import subprocess
+        
+        try:
+            result = subprocess.run(['git', 'ls-files', '-co', '-z', '--exclude-standard'],
+                                    capture_output=True)
+        except OSError:
+            return None  # git not installed
+        if result.returncode != 0:
+            return None  # not inside a work tree
+        
+        paths = dict.fromkeys(os.fsdecode(path) for path in result.stdout.split(b'\0') if path)
+        paths.update(dict.fromkeys(split_info))
+        paths.update(dict.fromkeys(self._gitignored_paths()))
+        
         large_files = []
-        for root, dirs, files in os.walk('.'):
-            # Remove directories starting with '.' from dirs list to prevent os.walk from entering them
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            for file in files:
-                file_path = Path(root) / file
-                try:
-                    if file_path.stat().st_size > self.size_limit_bytes:
-                        large_files.append(file_path)
-                except (OSError, FileNotFoundError):
-                    continue
+        for path in paths:
+            # Same rule as the directory scan: skip anything under a directory starting with .
+            if any(part.startswith('.') for part in Path(path).parent.parts):
+                continue
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue  # deleted from the work tree but still in the index
+            if stat.S_ISREG(st.st_mode) and st.st_size > self.size_limit_bytes:
+                large_files.append((path, st.st_size))
         return large_files
     
+    def _gitignored_paths(self):
+        """Return the entries in .gitignore that name a single file, like the ones add_to_gitignore writes"""
+        if not self.gitignore_path.exists():
+            return []
+        
+        paths = []
+        with open(self.gitignore_path, 'r') as f:
+            for line in f:
+                entry = line.strip()
+                # Skip comments, negations, directory rules and anything with glob characters
+                if not entry or entry[0] in '#!' or entry.endswith('/') or any(c in entry for c in '*?[\\'):
+                    continue
+                paths.append(entry.lstrip('/'))
+        return paths
+    
+    def find_large_files(self, split_info=None):
+        """Find files larger than size limit, excluding files in directories starting with .
+        
+        Inside a git work tree only files git lists are considered; split_info (loaded if
+        not given) supplies the already split originals that build added to .gitignore.
+        """
+        if split_info is None:
+            split_info = self.load_split_info()
+        found = self._find_via_git(split_info)
+        if found is None:
+            found = self._scan_large_files('.')
+        return [Candidate(Path(path), size) for path, size in found]
+    
     def _generate_split_prefix(self, file_path):
         """Generate split file prefix based on original file path"""
         # Replace path separators with underscores and remove extension
@@ -51,9 +183,33 @@ class LargeFileManager:
         stem = Path(file_str).stem
         return f"{stem}_split_"
     
-    def check_already_split(self, file_path):
-        """Check if a file has already been split and split files exist"""
-        split_info = self.load_split_info()
+    def _find_prefix_conflicts(self, candidates, split_info):
+        """Map each candidate whose split prefix is shared with another file to the files it clashes with.
+        
+        The prefix drops the extension, so e.g. book.pdf and book.epub map to the same part files.
+        Clashes with other candidates and with originals already recorded in split_info both count.
+        """
+        owners = {}
+        for file_str, file_info in split_info.items():
+            owners.setdefault(file_info.get('split_prefix'), set()).add(file_str)
+        for candidate in candidates:
+            owners.setdefault(self._generate_split_prefix(candidate.path), set()).add(str(candidate.path))
+        
+        conflicts = {}
+        for candidate in candidates:
+            file_str = str(candidate.path)
+            others = owners[self._generate_split_prefix(candidate.path)] - {file_str}
+            if others:
+                conflicts[file_str] = sorted(others)
+        return conflicts
+    
+    def check_already_split(self, file_path, size=None, split_info=None):
+        """Check if a file has already been split and split files exist.
+        
+        Pass size and split_info if already known to save a stat and a manifest load.
+        """
+        if split_info is None:
+            split_info = self.load_split_info()
         file_str = str(file_path)
         
         if file_str not in split_info:
@@ -62,25 +218,30 @@ class LargeFileManager:
         file_info = split_info[file_str]
         split_files = file_info.get('split_files', [])
         
-        # Check if all split files exist
-        all_exist = all(Path(sf).exists() for sf in split_files)
+        # Check if all split files exist, in a single stat pass
+        missing_files = []
+        for sf in split_files:
+            try:
+                os.stat(sf)
+            except OSError:
+                # Anything that stops us stat'ing it (ENOENT, ENOTDIR, EACCES) counts as missing
+                missing_files.append(sf)
         
-        if all_exist:
-            # Verify original file size hasn't changed
-            current_size = file_path.stat().st_size
-            recorded_size = file_info.get('original_size', 0)
-            
-            if current_size == recorded_size:
-                return True, file_info
-            else:
-                print(f"Warning: {file_path} size changed since last split (was {recorded_size}, now {current_size})")
-                # Clean up outdated split files
-                self._cleanup_outdated_split_files(split_files)
-                return False, None
-        else:
-            missing_files = [sf for sf in split_files if not Path(sf).exists()]
+        if missing_files:
             print(f"Warning: Some split files missing for {file_path}: {missing_files}")
             return False, None
+        
+        # Verify original file size hasn't changed
+        current_size = size if size is not None else file_path.stat().st_size
+        recorded_size = file_info.get('original_size', 0)
+        
+        if current_size == recorded_size:
+            return True, file_info
+        else:
+            print(f"Warning: {file_path} size changed since last split (was {recorded_size}, now {current_size})")
+            # Clean up outdated split files
+            self._cleanup_outdated_split_files(split_files)
+            return False, None
     
     def _cleanup_outdated_split_files(self, split_files):
         """Remove outdated split files"""
@@ -89,54 +250,224 @@ class LargeFileManager:
                 Path(split_file).unlink()
                 print(f"Removed outdated split file: {split_file}")
     
-    def split_file_python(self, file_path):
-        """Split file using Python file operations"""
-        print(f"Splitting {file_path}...")
+    def _buffer(self):
+        """Return this thread's reusable I/O buffer as a memoryview, allocating it on first use"""
+        view = getattr(self._local, 'buffer', None)
+        if view is None:
+            view = self._local.buffer = memoryview(bytearray(_COPY_BUFFER_SIZE))
+        return view
+    
+    def _copy_range(self, src_fd, dst_fd, offset, length, dst_offset=None):
+        """Copy length bytes starting at offset in src_fd to dst_fd.
+        
+        Writes at dst_offset without moving dst_fd's position if given, so several threads
+        can fill disjoint regions of one file; otherwise writes at dst_fd's current position.
+        Prefers copy_file_range (in-kernel copy, reflink on XFS/Btrfs), then sendfile,
+        and finally a plain read/write loop. Returns the number of bytes copied.
+        """
+        copied = 0
+        
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while copied < length:
+                    n = os.copy_file_range(src_fd, dst_fd, length - copied, offset + copied,
+                                           None if dst_offset is None else dst_offset + copied)
+                    if n == 0:
+                        # Some kernel/filesystem combinations return 0 instead of an error when
+                        # they can't copy; the length is known, so fall through to sendfile
+                        break
+                    copied += n
+            except OSError:
+                pass  # e.g. cross-device copy on older kernels, try sendfile instead
+            if copied == length:
+                return copied
+        
+        # sendfile always writes at the current position, so it can't serve dst_offset
+        if dst_offset is None and hasattr(os, 'sendfile'):
+            try:
+                while copied < length:
+                    n = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+                    if n == 0:
+                        break  # same as above, let the read/write loop decide whether this is EOF
+                    copied += n
+            except OSError:
+                pass  # sendfile to a regular file is not supported everywhere (e.g. macOS)
+            if copied == length:
+                return copied
+        
+        buf = self._buffer()
+        with open(src_fd, 'rb', buffering=0, closefd=False) as src, \
+                open(dst_fd, 'wb', buffering=0, closefd=False) as dst:
+            src.seek(offset + copied)
+            while copied < length:
+                n = src.readinto(buf[:min(length - copied, len(buf))])
+                if not n:
+                    break
+                written = 0
+                while written < n:
+                    if dst_offset is None:
+                        written += dst.write(buf[written:n])
+                    else:
+                        written += os.pwrite(dst_fd, buf[written:n], dst_offset + copied + written)
+                copied += n
+        return copied
+    
+    def _fadvise(self, fd, advice, offset=0, length=0):
+        """Pass a page cache hint for fd to the kernel where posix_fadvise exists (not Windows/macOS)"""
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        try:
+            os.posix_fadvise(fd, offset, length, getattr(os, advice))
+        except OSError:
+            pass  # purely advisory
+    
+    def _preallocate(self, fd, size):
+        """Reserve size bytes for fd up front so the filesystem can lay the file out contiguously"""
+        if size <= 0 or not hasattr(os, 'posix_fallocate'):
+            return
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass  # not supported on every filesystem; writing still works without it
+    
+    def _new_hasher(self, algorithm=None):
+        """Create a hash object for algorithm (default: _default_hash_algorithm()), or None if it isn't available here"""
+        import hashlib
+        
+        if algorithm is None:
+            algorithm = _default_hash_algorithm()
+        if algorithm == 'blake3':
+            blake3 = _blake3()
+            return blake3() if blake3 is not None else None
+        try:
+            return hashlib.new(algorithm)
+        except ValueError:
+            return None
+    
+    def _hash_file(self, path, *hashers):
+        """Feed the contents of path into every hasher"""
+        buf = self._buffer()
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                for hasher in hashers:
+                    hasher.update(buf[:n])
+    
+    def _verify_split_hashes(self, file_info, log=print):
+        """Check split files against the hashes recorded at split time.
+        
+        Returns True if they match, or if the manifest predates hashing or uses an
+        algorithm that isn't available here (in which case only sizes are checked).
+        """
+        split_hashes = file_info.get('split_hashes')
+        algorithm = file_info.get('hash_algorithm')
+        if not split_hashes or not algorithm:
+            return True
+        
+        original_hasher = self._new_hasher(algorithm)
+        if original_hasher is None:
+            log(f"Warning: {algorithm} not available, skipping hash check for {file_info['original_file']}")
+            return True
+        
+        for split_file, expected_hash in zip(file_info['split_files'], split_hashes):
+            part_hasher = self._new_hasher(algorithm)
+            self._hash_file(split_file, part_hasher, original_hasher)
+            if part_hasher.hexdigest() != expected_hash:
+                log(f"Hash mismatch for {split_file}: split file is corrupt")
+                return False
+        
+        original_hash = file_info.get('original_hash')
+        if original_hash and original_hasher.hexdigest() != original_hash:
+            log(f"Hash mismatch for {file_info['original_file']}: split files don't reassemble the original")
+            return False
+        return True
+    
+    def _original_matches_hash(self, file_info):
+        """Check an existing original against the recorded whole-file hash (True if there's nothing to check)"""
+        original_hash = file_info.get('original_hash')
+        algorithm = file_info.get('hash_algorithm')
+        if not original_hash or not algorithm:
+            return True
+        hasher = self._new_hasher(algorithm)
+        if hasher is None:
+            return True
+        self._hash_file(file_info['original_file'], hasher)
+        return hasher.hexdigest() == original_hash
+    
+    def split_file_python(self, file_path, size=None, log=print):
+        """Split file using Python file operations (size saves a stat if already known)"""
+        log(f"Splitting {file_path}...")
         
         # Generate split file prefix
         split_prefix = self._generate_split_prefix(file_path)
         
         # Calculate chunk size (slightly smaller than limit)
-        chunk_size = self.size_limit_bytes - (1024 * 1024)  # Leave 1MB buffer
+        chunk_size = self.size_limit_bytes - _SPLIT_HEADROOM
         
         split_files = []
+        split_hashes = []
+        original_hasher = self._new_hasher()
         part_number = 0
         
         try:
-            with open(file_path, 'rb') as input_file:
-                while True:
-                    # Read chunk
-                    chunk = input_file.read(chunk_size)
-                    if not chunk:
-                        break
+            src_fd = os.open(file_path, os.O_RDONLY | _O_BINARY)
+            try:
+                original_size = size if size is not None else os.fstat(src_fd).st_size
+                self._fadvise(src_fd, 'POSIX_FADV_SEQUENTIAL')
+                offset = 0
+                while offset < original_size:
+                    length = min(chunk_size, original_size - offset)
+                    self._fadvise(src_fd, 'POSIX_FADV_WILLNEED', offset, length)
                     
                     # Generate split file name
                     split_filename = f"{split_prefix}{part_number:03d}"
                     split_files.append(split_filename)
                     
-                    # Write chunk to split file
-                    with open(split_filename, 'wb') as output_file:
-                        output_file.write(chunk)
+                    # Copy chunk straight from the source fd into the split file
+                    dst_fd = os.open(split_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o644)
+                    try:
+                        self._preallocate(dst_fd, length)
+                        copied = self._copy_range(src_fd, dst_fd, offset, length)
+                    finally:
+                        os.close(dst_fd)
+                    
+                    if copied != length:
+                        raise IOError(f"short copy into {split_filename}: {copied} of {length} bytes")
                     
-                    size_mb = len(chunk) / (1024 * 1024)
-                    print(f"  Created {split_filename}: {size_mb:.1f}MB")
+                    # Hash the part while it's still in the page cache
+                    part_hasher = self._new_hasher()
+                    self._hash_file(split_filename, part_hasher, original_hasher)
+                    split_hashes.append(part_hasher.hexdigest())
                     
+                    size_mb = length / (1024 * 1024)
+                    log(f"  Created {split_filename}: {size_mb:.1f}MB")
+                    
+                    offset += length
                     part_number += 1
+            finally:
+                # The original won't be read again, don't let it crowd out the page cache
+                self._fadvise(src_fd, 'POSIX_FADV_DONTNEED')
+                os.close(src_fd)
             
             # Prepare split info
             split_info = {
                 'original_file': str(file_path),
-                'original_size': file_path.stat().st_size,
+                'original_size': original_size,
                 'split_prefix': split_prefix,
                 'split_files': split_files,
-                'split_count': len(split_files)
+                'split_count': len(split_files),
+                'hash_algorithm': _default_hash_algorithm(),
+                'original_hash': original_hasher.hexdigest(),
+                'split_hashes': split_hashes
             }
             
-            print(f"Split {file_path} into {len(split_files)} parts")
+            log(f"Split {file_path} into {len(split_files)} parts")
             return split_info
             
         except Exception as e:
-            print(f"Error splitting {file_path}: {e}")
+            log(f"Error splitting {file_path}: {e}")
             # Clean up any created split files on error
             for split_file in split_files:
                 if Path(split_file).exists():
@@ -144,117 +475,193 @@ class LargeFileManager:
             return None
     
     def load_split_info(self):
-        """Load split information from JSON file"""
-        if not Path(self.split_info_file).exists():
-            return {}
+        """Load split information from the JSON manifest plus any entries appended to the log since"""
+        loads, _ = _json_codec()
+        split_info = {}
         
-        try:
-            with open(self.split_info_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading split info: {e}")
-            return {}
+        if Path(self.split_info_file).exists():
+            try:
+                split_info = loads(Path(self.split_info_file).read_bytes())
+            except Exception as e:
+                print(f"Error loading split info: {e}")
+        
+        if Path(self.split_info_log).exists():
+            with open(self.split_info_log, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = loads(line)
+                    except ValueError:
+                        continue  # torn line from an interrupted build
+                    # Later entries override earlier ones for the same file
+                    split_info[entry['k']] = entry['v']
+        
+        return split_info
     
     def append_to_split_info(self, new_split_info):
-        """Append new split information to existing JSON file"""
-        # Load existing data
-        existing_info = self.load_split_info()
+        """Append new split information to the log without rewriting the manifest"""
+        _, dumps = _json_codec()
+        
+        with open(self.split_info_log, 'ab') as f:
+            for file_str, file_info in new_split_info.items():
+                f.write(dumps({'k': file_str, 'v': file_info}) + b"\n")
+        
+        print(f"Updated split information in {self.split_info_log}")
+    
+    def compact(self, new_keys=()):
+        """Fold the append-only log into the JSON manifest and remove the log.
+        
+        Log entries arrive in whatever order work finished; keys listed in new_keys are
+        written last, in that order, so the manifest comes out the same on every run.
+        """
+        _, dumps = _json_codec()
+        
+        if not Path(self.split_info_log).exists():
+            return
         
-        # Merge with new data
-        existing_info.update(new_split_info)
+        split_info = self.load_split_info()
+        for key in new_keys:
+            if key in split_info:
+                split_info[key] = split_info.pop(key)
         
-        # Save back to file
-        with open(self.split_info_file, 'w') as f:
-            json.dump(existing_info, f, indent=2)
+        # Write to a temporary file and swap it in, so an interrupted write never leaves a truncated manifest
+        tmp_file = f"{self.split_info_file}.tmp"
+        Path(tmp_file).write_bytes(dumps(split_info, indent=True))
+        os.replace(tmp_file, self.split_info_file)
+        Path(self.split_info_log).unlink()
         
         print(f"Updated split information in {self.split_info_file}")
     
-    def merge_split_files_python(self, file_info):
+    def _merge_part(self, split_file, out_fd, dst_offset=None):
+        """Copy one split file into out_fd at dst_offset (or the current position), returning its size"""
+        src_fd = os.open(split_file, os.O_RDONLY | _O_BINARY)
+        try:
+            self._fadvise(src_fd, 'POSIX_FADV_SEQUENTIAL')
+            length = os.fstat(src_fd).st_size
+            copied = self._copy_range(src_fd, out_fd, 0, length, dst_offset)
+        finally:
+            # Split files are deleted after a successful merge, drop their pages now
+            self._fadvise(src_fd, 'POSIX_FADV_DONTNEED')
+            os.close(src_fd)
+        
+        if copied != length:
+            raise IOError(f"short copy from {split_file}: {copied} of {length} bytes")
+        return copied
+    
+    def merge_split_files_python(self, file_info, log=print):
         """Merge split files back to original file using Python file operations"""
         original_file = file_info['original_file']
         split_files = file_info['split_files']
         expected_size = file_info['original_size']
         
-        print(f"Merging {original_file}...")
+        log(f"Merging {original_file}...")
         
         # Check if all split files exist
         missing_files = [f for f in split_files if not Path(f).exists()]
         if missing_files:
-            print(f"Missing split files for {original_file}: {missing_files}")
+            log(f"Missing split files for {original_file}: {missing_files}")
             return False
         
-        # Check if original file already exists
-        if Path(original_file).exists():
-            current_size = Path(original_file).stat().st_size
-            if current_size == expected_size:
-                print(f"Original file {original_file} already exists with correct size, skipping merge")
-                # Still remove split files
-                for split_file in split_files:
-                    Path(split_file).unlink()
-                    print(f"Removed {split_file}")
-                return True
-            else:
-                print(f"Original file {original_file} exists but size mismatch: expected {expected_size}, got {current_size}")
-                print("Will recreate the file from split files")
-        
+        merge_file = None
         try:
-            # Merge files using Python
-            with open(original_file, 'wb') as output_file:
-                for split_file in split_files:
-                    with open(split_file, 'rb') as input_file:
-                        while True:
-                            chunk = input_file.read(1024 * 1024)  # Read 1MB at a time
-                            if not chunk:
-                                break
-                            output_file.write(chunk)
+            # Check if original file already exists
+            if Path(original_file).exists():
+                current_size = Path(original_file).stat().st_size
+                if current_size == expected_size and not self._original_matches_hash(file_info):
+                    log(f"Original file {original_file} has the correct size but not the recorded hash")
+                    log("Will recreate the file from split files")
+                elif current_size == expected_size:
+                    log(f"Original file {original_file} already exists with correct size, skipping merge")
+                    # Still remove split files
+                    for split_file in split_files:
+                        Path(split_file).unlink()
+                        log(f"Removed {split_file}")
+                    return True
+                else:
+                    log(f"Original file {original_file} exists but size mismatch: expected {expected_size}, got {current_size}")
+                    log("Will recreate the file from split files")
             
-            # Verify file size
-            merged_size = Path(original_file).stat().st_size
+            if not self._verify_split_hashes(file_info, log):
+                return False
+            
+            # Each part's place in the original is known up front from the part sizes
+            part_sizes = [os.stat(split_file).st_size for split_file in split_files]
+            part_offsets = list(accumulate(part_sizes, initial=0))[:-1]
             
+            # Merge into a temporary file and only move it into place once it checks out, so an
+            # interrupted merge never leaves a full-size (preallocated) but incomplete original
+            merge_file = f"{original_file}.merging"
+            out_fd = os.open(merge_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o644)
+            try:
+                # Preallocating also makes concurrent writes to disjoint regions safe
+                self._preallocate(out_fd, expected_size)
+                
+                if hasattr(os, 'pwrite') and len(split_files) > 1:
+                    from concurrent.futures import ThreadPoolExecutor
+                    with ThreadPoolExecutor(max_workers=min(_MAX_PART_WORKERS, len(split_files))) as executor:
+                        copied = list(executor.map(self._merge_part, split_files, repeat(out_fd), part_offsets))
+                else:
+                    # No positional writes (Windows): append the parts in order
+                    copied = [self._merge_part(split_file, out_fd) for split_file in split_files]
+                merged_size = sum(copied)
+                
+                # Drop any preallocated tail the parts didn't fill, so the size check below stays honest
+                os.ftruncate(out_fd, merged_size)
+            finally:
+                os.close(out_fd)
+            
+            # Verify file size
             if merged_size == expected_size:
-                print(f"Successfully merged {original_file} ({merged_size / (1024*1024):.1f}MB)")
+                os.replace(merge_file, original_file)
+                log(f"Successfully merged {original_file} ({merged_size / (1024*1024):.1f}MB)")
                 
                 # Remove split files
                 for split_file in split_files:
                     Path(split_file).unlink()
-                    print(f"Removed {split_file}")
+                    log(f"Removed {split_file}")
                 
                 return True
             else:
-                print(f"Size mismatch for {original_file}: expected {expected_size}, got {merged_size}")
+                log(f"Size mismatch for {original_file}: expected {expected_size}, got {merged_size}")
                 # Remove the incorrectly merged file
-                Path(original_file).unlink()
+                Path(merge_file).unlink()
                 return False
                 
         except Exception as e:
-            print(f"Error merging {original_file}: {e}")
+            log(f"Error merging {original_file}: {e}")
+            if merge_file is not None and Path(merge_file).exists():
+                Path(merge_file).unlink()
             return False
     
     def add_to_gitignore(self, file_paths):
-        """Add file paths to .gitignore"""
+        """Append file paths that aren't already listed to .gitignore, returning how many were added"""
         if not file_paths:
-            return
+            return 0
         
         existing_entries = set()
+        needs_newline = False
         if self.gitignore_path.exists():
             with open(self.gitignore_path, 'r') as f:
-                existing_entries = set(line.strip() for line in f if line.strip())
+                content = f.read()
+            existing_entries = set(line.strip() for line in content.splitlines() if line.strip())
+            needs_newline = bool(content) and not content.endswith('\n')
         
-        new_entries = set()
+        new_entries = []
         for file_path in file_paths:
             # Convert to relative path and remove leading ./
-            if isinstance(file_path, Path):
-                rel_path = str(file_path.relative_to('.'))
-            else:
-                rel_path = str(Path(file_path).relative_to('.'))
-            new_entries.add(rel_path)
-        
-        all_entries = existing_entries | new_entries
-        with open(self.gitignore_path, 'w') as f:
-            for entry in sorted(all_entries):
-                f.write(f"{entry}\n")
+            rel_path = str(Path(file_path).relative_to('.'))
+            if rel_path not in existing_entries:
+                existing_entries.add(rel_path)
+                new_entries.append(rel_path)
+        
+        if new_entries:
+            # Append only, so the existing order and comments are left untouched
+            with open(self.gitignore_path, 'a') as f:
+                if needs_newline:
+                    f.write("\n")
+                f.write("\n".join(new_entries) + "\n")
         
         print(f"Added {len(new_entries)} files to .gitignore")
+        return len(new_entries)
     
     def find_split_files(self):
         """Find all split files based on JSON info"""
@@ -266,11 +673,32 @@ class LargeFileManager:
         
         return [f for f in all_split_files if Path(f).exists()]
     
+    def _run_parallel(self, func, items):
+        """Run func(item, log) for each item in a thread pool, yielding (item, result) as each finishes.
+        
+        Each task's output is buffered and printed as a block once it finishes,
+        so lines from files processed concurrently don't interleave.
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(_MAX_WORKERS, len(items)))) as executor:
+            futures = {}
+            for item in items:
+                lines = []
+                futures[executor.submit(func, item, log=lines.append)] = (item, lines)
+            
+            for future in as_completed(futures):
+                item, lines = futures[future]
+                for line in lines:
+                    print(line)
+                yield item, future.result()
+    
     def build(self):
         """Find large files, split them, and add to .gitignore (keep original files)"""
         print(f"Finding files larger than {self.size_limit_bytes // (1024*1024)}MB...")
         
-        large_files = self.find_large_files()
+        recorded_split_info = self.load_split_info()
+        large_files = self.find_large_files(recorded_split_info)
         if not large_files:
             print("No files larger than size limit found")
             return
@@ -281,13 +709,13 @@ class LargeFileManager:
         files_to_split = []
         already_split_count = 0
         
-        for file_path in large_files:
-            is_split, split_info = self.check_already_split(file_path)
+        for candidate in large_files:
+            is_split, split_info = self.check_already_split(candidate.path, candidate.size, recorded_split_info)
             if is_split:
-                print(f"File {file_path} already split into {split_info['split_count']} parts, skipping")
+                print(f"File {candidate.path} already split into {split_info['split_count']} parts, skipping")
                 already_split_count += 1
             else:
-                files_to_split.append(file_path)
+                files_to_split.append(candidate)
         
         if already_split_count > 0:
             print(f"Skipped {already_split_count} files that are already split")
@@ -296,29 +724,50 @@ class LargeFileManager:
             print("No new files need to be split")
             return
         
+        # Refuse files whose split parts would collide with another file's instead of letting
+        # concurrent splits overwrite each other's parts
+        conflicts = self._find_prefix_conflicts(files_to_split, recorded_split_info)
+        for candidate in files_to_split:
+            if str(candidate.path) in conflicts:
+                others = ', '.join(conflicts[str(candidate.path)])
+                print(f"Error: {candidate.path} would use the same split files "
+                      f"({self._generate_split_prefix(candidate.path)}NNN) as {others}, skipping")
+        files_to_split = [candidate for candidate in files_to_split if str(candidate.path) not in conflicts]
+        
+        if not files_to_split:
+            print("No files were split")
+            return
+        
         print(f"Processing {len(files_to_split)} new files for splitting")
         
         # Split large files and collect split info
+        results = {}
+        split_candidate = lambda candidate, log: self.split_file_python(candidate.path, candidate.size, log=log)
+        for candidate, split_info in self._run_parallel(split_candidate, files_to_split):
+            if split_info:
+                # Record each file as soon as it's done so an interrupted build doesn't redo it
+                self.append_to_split_info({str(candidate.path): split_info})
+                results[str(candidate.path)] = split_info
+        
+        # Files finish in any order; keep the manifest and .gitignore in discovery order
         new_split_info = {}
         files_for_gitignore = []
-        
-        for file_path in files_to_split:
-            split_info = self.split_file_python(file_path)
-            if split_info:
-                new_split_info[str(file_path)] = split_info
-                files_for_gitignore.append(file_path)
+        for candidate in files_to_split:
+            if str(candidate.path) in results:
+                new_split_info[str(candidate.path)] = results[str(candidate.path)]
+                files_for_gitignore.append(candidate.path)
         
         if not new_split_info:
             print("No files were split")
             return
         
-        # Append to existing split information
-        self.append_to_split_info(new_split_info)
+        # Rewrite the manifest once, now that all new entries are in the log
+        self.compact(new_split_info)
         
         # Add original files to .gitignore
-        self.add_to_gitignore(files_for_gitignore)
+        added_count = self.add_to_gitignore(files_for_gitignore)
         
-        print(f"Build completed successfully. Split {len(new_split_info)} new files, {len(files_for_gitignore)} files added to .gitignore")
+        print(f"Build completed successfully. Split {len(new_split_info)} new files, {added_count} files added to .gitignore")
     
     def extract_all(self):
         """Merge split files back to original files (no gitignore or JSON modification)"""
@@ -331,10 +780,8 @@ class LargeFileManager:
         print(f"Found split information for {len(split_info)} files")
         
         # Merge split files
-        merged_count = 0
-        for original_file, file_info in split_info.items():
-            if self.merge_split_files_python(file_info):
-                merged_count += 1
+        results = self._run_parallel(self.merge_split_files_python, list(split_info.values()))
+        merged_count = sum(1 for _, merged in results if merged)
         
         if merged_count > 0:
             print(f"Successfully merged {merged_count} files")
@@ -354,37 +801,51 @@ class LargeFileManager:
         else:
             print("No split files to clean")
         
-        # Remove split info file
-        if Path(self.split_info_file).exists():
-            Path(self.split_info_file).unlink()
-            print(f"Removed {self.split_info_file}")
+        # Remove split info file and any uncompacted log
+        for info_file in (self.split_info_file, self.split_info_log):
+            if Path(info_file).exists():
+                Path(info_file).unlink()
+                print(f"Removed {info_file}")
 
-def main():
-    parser = argparse.ArgumentParser(description="Manage large files by splitting them using Python")
-    parser.add_argument('command', choices=['build', 'all', 'clean', 'help'],
-                       help='Command to execute')
-    parser.add_argument('--size-limit', default='100M',
+def _add_common_options(parser, size_limit, split_info):
+    """Add the options shared by every command that works on split files"""
+    parser.add_argument('--size-limit', default=size_limit,
                        help='Size limit for large files (default: 100M)')
-    parser.add_argument('--split-info', default='split_files_info.json',
+    parser.add_argument('--split-info', default=split_info,
                        help='Split information file (default: split_files_info.json)')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage large files by splitting them using Python",
+        epilog="Original files are preserved during build, and 'build' skips files that are already split.\n"
+               "'all' reconstructs files but leaves .gitignore and JSON unchanged.",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    _add_common_options(parser, '100M', 'split_files_info.json')
+    
+    # The options are accepted after the command as well; SUPPRESS keeps a subcommand from
+    # overwriting a value given before it with its own default
+    common = argparse.ArgumentParser(add_help=False)
+    _add_common_options(common, argparse.SUPPRESS, argparse.SUPPRESS)
+    
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.add_parser('build', parents=[common],
+                          help='Find files over the size limit, split them, add originals to .gitignore')
+    subparsers.add_parser('all', parents=[common],
+                          help='Merge split files back to original files (no gitignore/JSON modification)')
+    subparsers.add_parser('clean', parents=[common],
+                          help='Remove all split files and split info file')
+    subparsers.add_parser('help', help='Show this help message')
     
     args = parser.parse_args()
     
-    if args.command == 'help':
-        print("Available commands:")
-        print("  build  - Find files >100MB, split them using Python, add to .gitignore (keep originals)")
-        print("  all    - Merge split files back to original files (no gitignore/JSON modification)")
-        print("  clean  - Remove all split files and split info file")
-        print("  help   - Show this help message")
-        print("")
-        print("Note: Original files are preserved during build process")
-        print("Note: 'build' skips files that are already split")
-        print("Note: 'all' command reconstructs files but leaves .gitignore and JSON unchanged")
+    # Nothing to do for these, so skip setting up a manager at all
+    if args.command in (None, 'help'):
+        parser.print_help()
         return
     
-    manager = LargeFileManager(args.size_limit, args.split_info)
-    
     try:
+        manager = LargeFileManager(args.size_limit, args.split_info)
+        
         if args.command == 'build':
             manager.build()
         elif args.command == 'all':